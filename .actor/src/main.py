@@ -1,12 +1,26 @@
+import asyncio
 import csv
 import io
 import json
+import shutil
+import sys
 import urllib.request
-from decimal import Decimal, InvalidOperation
-from typing import Any, Dict, List, Set, Tuple
+from collections import defaultdict
+from dataclasses import dataclass, field, fields
+from decimal import Decimal, InvalidOperation, Overflow
+from itertools import chain
+from operator import attrgetter
+from typing import Any, DefaultDict, Dict, List, NamedTuple, Set, Tuple, Union
 
 from apify import Actor
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is an optional accelerator
+    pa = None
+    pa_csv = None
+
 
 # ------------- helpers -------------
 
@@ -30,11 +44,108 @@ def safe_decimal(value: Any) -> Decimal:
         return Decimal("0")
 
 
+MICROS_PER_CENT = 10_000
+
+# Micro-units are plain ints except for values finer than 1e-6 (or in
+# exponent form), which stay exact Decimals so no digits are lost.
+Micros = Union[int, Decimal]
+
+
+def to_micros(value: Any) -> Micros:
+    """
+    Parse a numeric string into integer micro-units (1e-6); treat
+    blanks/garbage as 0.
+
+    Plain values like "-1,234.005" with up to 6 decimal places are handled
+    with int arithmetic only. Anything else (exponents, more decimals, ...)
+    goes through safe_decimal and is returned as an exact Decimal count of
+    micro-units. Nothing is rounded here; totals are rounded once, in
+    fmt_micros.
+    """
+    s = norm(value).replace(",", "")
+    if not s:
+        return 0
+
+    digits = s[1:] if s[0] in "+-" else s
+    whole, _, frac = digits.partition(".")
+    if (
+        (whole or frac)
+        and digits.isascii()
+        and (not whole or whole.isdigit())
+        and (not frac or (len(frac) <= 6 and frac.isdigit()))
+    ):
+        micros = int(whole or "0") * 1_000_000 + int(frac.ljust(6, "0"))
+        return -micros if s[0] == "-" else micros
+
+    d = safe_decimal(s)
+    if not d.is_finite():
+        # NaN / Infinity pass through so a corrupt value shows up in the
+        # formatted total instead of being folded into it as 0.
+        return Decimal("NaN") if d.is_snan() else d
+    try:
+        return d.scaleb(6)
+    except Overflow:
+        # Finite, but too large to scale to micro-units; treat as garbage
+        Actor.log.warning(f"Amount {s!r} is out of range; counting it as 0.")
+        return 0
+
+
+def fmt_micros(micros: Micros) -> str:
+    """
+    Round a micro-unit total half-even to the cent and format it as a 2dp
+    amount string, matching f"{Decimal(total):.2f}".
+
+    >>> fmt_micros(sum(map(to_micros, ["0.005"] * 3 + ["1.0049"] * 2)))
+    '2.02'
+    >>> fmt_micros(sum(map(to_micros, ["0.0049999999"] * 2)))
+    '0.01'
+    """
+    if isinstance(micros, Decimal):
+        return f"{micros.scaleb(-6):.2f}"
+
+    cents, rem = divmod(abs(micros), MICROS_PER_CENT)
+    if rem > MICROS_PER_CENT // 2 or (rem == MICROS_PER_CENT // 2 and cents % 2):
+        cents += 1
+    sign = "-" if micros < 0 else ""
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+
+def read_csv_arrow(buf: io.BytesIO) -> List[Dict[str, Any]]:
+    """
+    Parse a CSV buffer with pyarrow's native reader.
+
+    Every column is read as a string so values match what csv.DictReader
+    would produce (no type inference eating leading zeros in invoice
+    numbers, blanks stay "" rather than null).
+    """
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=1 << 20)
+    parse_options = pa_csv.ParseOptions(delimiter=",")
+
+    # Take the column names from pyarrow's own view of the header so the
+    # string types below are keyed exactly as pyarrow will look them up.
+    buf.seek(0)
+    header = pa_csv.open_csv(
+        buf, read_options=read_options, parse_options=parse_options
+    ).schema.names
+
+    buf.seek(0)
+    table = pa_csv.read_csv(
+        buf,
+        read_options=read_options,
+        parse_options=parse_options,
+        convert_options=pa_csv.ConvertOptions(
+            column_types={h: pa.string() for h in header},
+        ),
+    )
+    return table.to_pylist()
+
+
 def download_csv(url: str, label: str) -> List[Dict[str, Any]]:
     """
     Download a CSV from Dropbox and parse it into a list of dicts.
 
-    First try csv.DictReader; if it fails due to newline/quoting issues,
+    Use pyarrow when it is installed; otherwise (or if it rejects the file)
+    try csv.DictReader; if that fails due to newline/quoting issues,
     fall back to a naive split-based parser.
     """
     if not url:
@@ -42,17 +153,35 @@ def download_csv(url: str, label: str) -> List[Dict[str, Any]]:
 
     Actor.log.info(f"Downloading {label} CSV from {url}")
 
+    # Stream the body into a single buffer in chunks; both parsers below
+    # decode from it incrementally rather than holding extra full copies.
+    buf = io.BytesIO()
     with urllib.request.urlopen(url) as resp:
-        csv_bytes = resp.read()
-
-    text = csv_bytes.decode("utf-8", errors="replace")
+        shutil.copyfileobj(resp, buf, 1 << 20)
 
     rows: List[Dict[str, Any]] = []
 
-    # Primary attempt: DictReader
+    # Fast path: pyarrow
+    if pa is not None:
+        try:
+            rows = read_csv_arrow(buf)
+            Actor.log.info(f"{label} rows (pyarrow): {len(rows)}")
+            return rows
+        except ValueError as e:
+            # ArrowInvalid, or UnicodeDecodeError on non-UTF-8 headers
+            Actor.log.warning(
+                f"{label} CSV parse via pyarrow failed: {e!r}. "
+                f"Falling back to DictReader."
+            )
+
+    # Second attempt: DictReader
+    buf.seek(0)
+    text_io = io.TextIOWrapper(
+        buf, encoding="utf-8-sig", errors="replace", newline=""
+    )
     try:
-        reader = csv.DictReader(io.StringIO(text))
-        rows = [dict(r) for r in reader]
+        reader = csv.DictReader(text_io)
+        rows = list(reader)
         Actor.log.info(f"{label} rows (DictReader): {len(rows)}")
         return rows
     except csv.Error as e:
@@ -60,26 +189,45 @@ def download_csv(url: str, label: str) -> List[Dict[str, Any]]:
             f"{label} CSV parse via DictReader failed: {e!r}. "
             f"Falling back to simple split parser; some rows may be skipped."
         )
+    finally:
+        text_io.detach()
 
-    # Fallback: naive split parser
-    lines = [ln for ln in text.splitlines() if ln.strip()]
-    if not lines:
-        Actor.log.warning(f"{label} CSV has no non-empty lines after fallback parsing.")
-        return []
-
-    header = [h.strip() for h in lines[0].split(",")]
-    for ln in lines[1:]:
-        parts = [p.strip() for p in ln.split(",")]
-        if len(parts) != len(header):
-            # Skip malformed lines
-            continue
-        row = dict(zip(header, parts))
-        rows.append(row)
+    # Fallback: naive split parser, streamed line by line from the buffer
+    buf.seek(0)
+    text_io = io.TextIOWrapper(buf, encoding="utf-8-sig", errors="replace")
+    try:
+        lines = (ln for ln in text_io if ln.strip())
+        first = next(lines, None)
+        if first is None:
+            Actor.log.warning(
+                f"{label} CSV has no non-empty lines after fallback parsing."
+            )
+            return []
+
+        header = [h.strip() for h in first.split(",")]
+        n = len(header)
+        for ln in lines:
+            parts = ln.split(",")
+            if len(parts) != n:
+                # Skip malformed lines
+                continue
+            rows.append(dict(zip(header, (p.strip() for p in parts))))
+    finally:
+        text_io.detach()
 
     Actor.log.info(f"{label} rows (fallback): {len(rows)}")
     return rows
 
 
+# ---- amount header candidates (tried in order) ----
+
+LEDGER_GROSS_COLS = ("Gross (AUD)", "Gross", "Gross (Source)")
+LEDGER_NET_COLS = ("Net (AUD)", "Net", "Net (Source)")
+LEDGER_GST_COLS = ("GST (AUD)", "GST", "GST (Source)")
+INVOICE_LINE_COLS = ("Line amount", "Line Amount", "Line total", "Line Total")
+INVOICE_TAX_COLS = ("Tax amount", "Tax Amount", "GST", "GST (AUD)")
+
+
 # ---- key extractors ----
 
 def ledger_invoice_key(row: Dict[str, Any]) -> str:
@@ -166,22 +314,109 @@ def manifest_pdf_path(row: Dict[str, Any]) -> str:
     )
 
 
-def sum_field(
+def resolve_cols(
+    rows: List[Dict[str, Any]],
+    candidates: Tuple[str, ...],
+) -> List[str]:
+    """
+    Narrow candidate header names down to the ones this file actually has.
+
+    Every row parsed from one CSV has the same keys, so the first row is
+    enough.
+    """
+    headers = rows[0].keys() if rows else ()
+    return [c for c in candidates if c in headers]
+
+
+def micros_column(
     rows: List[Dict[str, Any]],
-    candidates: List[str],
-) -> Decimal:
+    candidates: Tuple[str, ...],
+) -> List[Micros]:
     """
-    Sum a numeric field across rows, trying multiple header names in order.
+    Parse a numeric field once into a column of micro-units (one per row),
+    trying multiple header names in order.
 
-    e.g. candidates = ["Gross (AUD)", "Gross", "Gross (Source)"].
+    e.g. candidates = LEDGER_GROSS_COLS.
     """
-    total = Decimal("0")
+    cols = resolve_cols(rows, candidates)
+    if not cols:
+        return [0] * len(rows)
+    if len(cols) == 1:
+        col = cols[0]
+        return [to_micros(row[col]) for row in rows]
+
+    column: List[Micros] = []
     for row in rows:
-        for col in candidates:
-            if col in row and norm(row[col]) != "":
-                total += safe_decimal(row[col])
+        micros = 0
+        for col in cols:
+            if norm(row[col]) != "":
+                micros = to_micros(row[col])
                 break
-    return total
+        column.append(micros)
+    return column
+
+
+def sum_field(column: List[Micros], idxs: List[int]) -> Micros:
+    """Sum the given rows of a micro-unit column (see micros_column)."""
+    return sum(column[i] for i in idxs)
+
+
+class LedgerTotals(NamedTuple):
+    """Ledger aggregates for one invoice number, computed once per run."""
+
+    row_count: int
+    gross: Micros
+    net: Micros
+    gst: Micros
+    contact: str
+    description: str
+    currency: str
+
+
+NO_LEDGER = LedgerTotals(0, 0, 0, 0, "", "", "")
+
+
+def csv_column(header: str) -> Any:
+    """Declare a MasterRow field together with its output CSV header."""
+    return field(metadata={"header": header})
+
+
+@dataclass(slots=True)
+class MasterRow:
+    """
+    One output row of the ledger master CSV.
+
+    Fields are declared in output column order; each carries its CSV
+    header name, which MASTER_CSV_HEADER is built from.
+    """
+
+    year: str = csv_column("Year")
+    invoice_guid: str = csv_column("Invoice_GUID")
+    invoice_number: str = csv_column("Invoice_Number")
+    invoice_type: str = csv_column("Invoice_Type")
+    invoice_date: str = csv_column("Invoice_Date")
+    invoice_contact: str = csv_column("Invoice_Contact")
+    invoice_description: str = csv_column("Invoice_Description")
+    invoice_currency: str = csv_column("Invoice_Currency")
+    invoice_line_count: int = csv_column("Invoice_Line_Count")
+    invoice_line_total: str = csv_column("Invoice_Line_Total")
+    invoice_tax_total: str = csv_column("Invoice_Tax_Total")
+
+    in_ledger: str = csv_column("In_Ledger")
+    ledger_row_count: int = csv_column("Ledger_Row_Count")
+    ledger_gross_aud: str = csv_column("Ledger_Gross_AUD")
+    ledger_net_aud: str = csv_column("Ledger_Net_AUD")
+    ledger_gst_aud: str = csv_column("Ledger_GST_AUD")
+
+    in_manifest: str = csv_column("In_Manifest")
+    manifest_row_count: int = csv_column("Manifest_Row_Count")
+    pdf_present: str = csv_column("PDF_Present")
+    pdf_count: int = csv_column("PDF_Count")
+    pdf_paths: str = csv_column("PDF_Paths")
+
+
+MASTER_CSV_HEADER = [f.metadata["header"] for f in fields(MasterRow)]
+project_master_row = attrgetter(*(f.name for f in fields(MasterRow)))
 
 
 # ------------- main logic -------------
@@ -204,10 +439,13 @@ async def main() -> None:
             )
             return
 
-        # 1) Download all three sources
-        ledger_rows = download_csv(ledger_url, "ledger")
-        invoice_rows = download_csv(invoice_url, "invoice")
-        manifest_rows = download_csv(manifest_url, "manifest")
+        # 1) Download all three sources concurrently (blocking I/O + parsing
+        # run in worker threads)
+        ledger_rows, invoice_rows, manifest_rows = await asyncio.gather(
+            asyncio.to_thread(download_csv, ledger_url, "ledger"),
+            asyncio.to_thread(download_csv, invoice_url, "invoice"),
+            asyncio.to_thread(download_csv, manifest_url, "manifest"),
+        )
 
         Actor.log.info(
             f"Row counts: ledger={len(ledger_rows)}, "
@@ -219,207 +457,188 @@ async def main() -> None:
             return
 
         # 2) Build indices
+        # Ledger and invoice indices hold row positions; numeric fields are
+        # read from per-source micro-unit columns parsed once up front.
 
         # Ledger indexed by invoice number
-        ledger_by_invnum: Dict[str, List[Dict[str, Any]]] = {}
-        for r in ledger_rows:
+        ledger_by_invnum: DefaultDict[str, List[int]] = defaultdict(list)
+        for i, r in enumerate(ledger_rows):
             k = ledger_invoice_key(r)
             if not k:
                 continue
-            ledger_by_invnum.setdefault(k, []).append(r)
+            ledger_by_invnum[k].append(i)
+
+        ledger_gross_micros = micros_column(ledger_rows, LEDGER_GROSS_COLS)
+        ledger_net_micros = micros_column(ledger_rows, LEDGER_NET_COLS)
+        ledger_gst_micros = micros_column(ledger_rows, LEDGER_GST_COLS)
+
+        # Ledger totals per invoice number, shared by the GUID pass and the
+        # ledger-only pass
+        ledger_totals: Dict[str, LedgerTotals] = {}
+        for k, idxs in ledger_by_invnum.items():
+            first_l = ledger_rows[idxs[0]]
+            ledger_totals[k] = LedgerTotals(
+                row_count=len(idxs),
+                gross=sum_field(ledger_gross_micros, idxs),
+                net=sum_field(ledger_net_micros, idxs),
+                gst=sum_field(ledger_gst_micros, idxs),
+                contact=norm(first_l.get("Contact")),
+                description=norm(first_l.get("Description")),
+                currency=sys.intern(norm(first_l.get("Currency"))),
+            )
 
-        # Invoices indexed by GUID and by invoice number
-        invoice_by_guid: Dict[str, List[Dict[str, Any]]] = {}
-        invoice_by_invnum: Dict[str, List[Dict[str, Any]]] = {}
-        for r in invoice_rows:
+        # Invoices indexed by GUID and by invoice number.
+        # Invoice numbers are kept in a parallel list (by row position) so
+        # later passes never re-derive them.
+        invoice_by_guid: DefaultDict[str, List[int]] = defaultdict(list)
+        invoice_by_invnum: DefaultDict[str, List[int]] = defaultdict(list)
+        invoice_invnums: List[str] = []
+        for i, r in enumerate(invoice_rows):
             g = invoice_guid_key(r)
             n = invoice_number_key(r)
+            invoice_invnums.append(n)
             if g:
-                invoice_by_guid.setdefault(g, []).append(r)
+                invoice_by_guid[g].append(i)
             if n:
-                invoice_by_invnum.setdefault(n, []).append(r)
+                invoice_by_invnum[n].append(i)
+
+        inv_line_micros = micros_column(invoice_rows, INVOICE_LINE_COLS)
+        inv_tax_micros = micros_column(invoice_rows, INVOICE_TAX_COLS)
 
         # Manifest indexed by GUID
-        manifest_by_guid: Dict[str, List[Dict[str, Any]]] = {}
+        manifest_by_guid: DefaultDict[str, List[Dict[str, Any]]] = defaultdict(list)
         for r in manifest_rows:
             g = manifest_guid_key(r)
             if not g:
                 continue
-            manifest_by_guid.setdefault(g, []).append(r)
+            manifest_by_guid[g].append(r)
 
         # 3) Build unified key space
         # Use invoice GUID as the primary key where possible
-        guid_keys: Set[str] = set(invoice_by_guid.keys()) | set(manifest_by_guid.keys())
+        guid_keys: List[str] = list(
+            dict.fromkeys(chain(invoice_by_guid, manifest_by_guid))
+        )
 
         # Per-invoice ledger master rows
-        master_rows: List[Dict[str, Any]] = []
+        master_rows: List[MasterRow] = []
+        # Invoice numbers matched via a GUID, collected for step 4
+        invnums_from_guid: Set[str] = set()
 
-        for guid in sorted(guid_keys):
-            inv_rows = invoice_by_guid.get(guid, [])
+        for guid in guid_keys:
+            inv_idxs = invoice_by_guid.get(guid, [])
             man_rows = manifest_by_guid.get(guid, [])
 
             # We may have multiple invoice rows per GUID (line items)
-            first_inv = inv_rows[0] if inv_rows else {}
+            first_inv = invoice_rows[inv_idxs[0]] if inv_idxs else {}
 
-            inv_num = invoice_number_key(first_inv)
+            inv_num = invoice_invnums[inv_idxs[0]] if inv_idxs else ""
+            if inv_num:
+                invnums_from_guid.add(inv_num)
             inv_contact = norm(first_inv.get("Contact"))
             inv_desc = norm(first_inv.get("Description"))
-            inv_date = norm(first_inv.get("Date"))
-            inv_type = norm(first_inv.get("Type"))
-            inv_currency = norm(first_inv.get("Currency"))
-            inv_line_total = sum_field(
-                inv_rows, ["Line amount", "Line Amount", "Line total", "Line Total"]
-            )
-            inv_tax_total = sum_field(
-                inv_rows, ["Tax amount", "Tax Amount", "GST", "GST (AUD)"]
-            )
-
-            # Ledger rows for this invoice (join via invoice number)
-            ledger_rows_for_invoice = ledger_by_invnum.get(inv_num, []) if inv_num else []
+            # Low-cardinality values repeat across most master rows; intern
+            # them so every row shares one string object.
+            inv_date = sys.intern(norm(first_inv.get("Date")))
+            inv_type = sys.intern(norm(first_inv.get("Type")))
+            inv_currency = sys.intern(norm(first_inv.get("Currency")))
+            inv_line_total = sum_field(inv_line_micros, inv_idxs)
+            inv_tax_total = sum_field(inv_tax_micros, inv_idxs)
 
-            ledger_gross = sum_field(
-                ledger_rows_for_invoice,
-                ["Gross (AUD)", "Gross", "Gross (Source)"],
-            )
-            ledger_net = sum_field(
-                ledger_rows_for_invoice,
-                ["Net (AUD)", "Net", "Net (Source)"],
-            )
-            ledger_gst = sum_field(
-                ledger_rows_for_invoice,
-                ["GST (AUD)", "GST", "GST (Source)"],
-            )
+            # Ledger totals for this invoice (join via invoice number)
+            ledger = ledger_totals.get(inv_num, NO_LEDGER)
 
             # Manifest / PDF info
-            pdf_paths = sorted(
-                {
-                    manifest_pdf_path(r)
-                    for r in man_rows
-                    if manifest_pdf_path(r)
-                }
-            )
-            pdf_present = bool(pdf_paths)
+            seen: Dict[str, None] = {}
+            for r in man_rows:
+                p = manifest_pdf_path(r)
+                if p:
+                    seen[p] = None
+            pdf_count = len(seen)
+            pdf_paths_str = "; ".join(sorted(seen) if pdf_count > 1 else seen)
 
             master_rows.append(
-                {
-                    "Year": year,
-                    "Invoice_GUID": guid,
-                    "Invoice_Number": inv_num,
-                    "Invoice_Type": inv_type,
-                    "Invoice_Date": inv_date,
-                    "Invoice_Contact": inv_contact,
-                    "Invoice_Description": inv_desc,
-                    "Invoice_Currency": inv_currency,
-                    "Invoice_Line_Count": len(inv_rows),
-                    "Invoice_Line_Total": f"{inv_line_total:.2f}",
-                    "Invoice_Tax_Total": f"{inv_tax_total:.2f}",
-
-                    "In_Ledger": "Y" if ledger_rows_for_invoice else "N",
-                    "Ledger_Row_Count": len(ledger_rows_for_invoice),
-                    "Ledger_Gross_AUD": f"{ledger_gross:.2f}",
-                    "Ledger_Net_AUD": f"{ledger_net:.2f}",
-                    "Ledger_GST_AUD": f"{ledger_gst:.2f}",
-
-                    "In_Manifest": "Y" if man_rows else "N",
-                    "Manifest_Row_Count": len(man_rows),
-                    "PDF_Present": "Y" if pdf_present else "N",
-                    "PDF_Count": len(pdf_paths),
-                    "PDF_Paths": "; ".join(pdf_paths),
-                }
+                MasterRow(
+                    year=year,
+                    invoice_guid=guid,
+                    invoice_number=inv_num,
+                    invoice_type=inv_type,
+                    invoice_date=inv_date,
+                    invoice_contact=inv_contact,
+                    invoice_description=inv_desc,
+                    invoice_currency=inv_currency,
+                    invoice_line_count=len(inv_idxs),
+                    invoice_line_total=fmt_micros(inv_line_total),
+                    invoice_tax_total=fmt_micros(inv_tax_total),
+
+                    in_ledger="Y" if ledger.row_count else "N",
+                    ledger_row_count=ledger.row_count,
+                    ledger_gross_aud=fmt_micros(ledger.gross),
+                    ledger_net_aud=fmt_micros(ledger.net),
+                    ledger_gst_aud=fmt_micros(ledger.gst),
+
+                    in_manifest="Y" if man_rows else "N",
+                    manifest_row_count=len(man_rows),
+                    pdf_present="Y" if pdf_count else "N",
+                    pdf_count=pdf_count,
+                    pdf_paths=pdf_paths_str,
+                )
             )
 
         # 4) Ledger-only invoice numbers (no invoice master / manifest)
-        invnums_from_guid = {
-            invoice_number_key(rows[0])
-            for rows in invoice_by_guid.values()
-            if rows
-        }
-        invnums_from_ledger = set(ledger_by_invnum.keys())
+        invnums_from_ledger = set(ledger_totals.keys())
 
         ledger_only_invnums = invnums_from_ledger - invnums_from_guid
 
-        for inv_num in sorted(ledger_only_invnums):
-            l_rows = ledger_by_invnum.get(inv_num, [])
-
-            ledger_gross = sum_field(
-                l_rows,
-                ["Gross (AUD)", "Gross", "Gross (Source)"],
-            )
-            ledger_net = sum_field(
-                l_rows,
-                ["Net (AUD)", "Net", "Net (Source)"],
-            )
-            ledger_gst = sum_field(
-                l_rows,
-                ["GST (AUD)", "GST", "GST (Source)"],
-            )
-
-            # Sample description/contact from ledger
-            first_l = l_rows[0] if l_rows else {}
-            ledger_contact = norm(first_l.get("Contact"))
-            ledger_desc = norm(first_l.get("Description"))
+        for inv_num in ledger_only_invnums:
+            # Description/contact were sampled from the first ledger row
+            ledger = ledger_totals[inv_num]
 
             master_rows.append(
-                {
-                    "Year": year,
-                    "Invoice_GUID": "",
-                    "Invoice_Number": inv_num,
-                    "Invoice_Type": "",
-                    "Invoice_Date": "",
-                    "Invoice_Contact": ledger_contact,
-                    "Invoice_Description": ledger_desc,
-                    "Invoice_Currency": norm(first_l.get("Currency")),
-                    "Invoice_Line_Count": 0,
-                    "Invoice_Line_Total": "0.00",
-                    "Invoice_Tax_Total": "0.00",
-
-                    "In_Ledger": "Y",
-                    "Ledger_Row_Count": len(l_rows),
-                    "Ledger_Gross_AUD": f"{ledger_gross:.2f}",
-                    "Ledger_Net_AUD": f"{ledger_net:.2f}",
-                    "Ledger_GST_AUD": f"{ledger_gst:.2f}",
-
-                    "In_Manifest": "N",
-                    "Manifest_Row_Count": 0,
-                    "PDF_Present": "N",
-                    "PDF_Count": 0,
-                    "PDF_Paths": "",
-                }
+                MasterRow(
+                    year=year,
+                    invoice_guid="",
+                    invoice_number=inv_num,
+                    invoice_type="",
+                    invoice_date="",
+                    invoice_contact=ledger.contact,
+                    invoice_description=ledger.description,
+                    invoice_currency=ledger.currency,
+                    invoice_line_count=0,
+                    invoice_line_total="0.00",
+                    invoice_tax_total="0.00",
+
+                    in_ledger="Y",
+                    ledger_row_count=ledger.row_count,
+                    ledger_gross_aud=fmt_micros(ledger.gross),
+                    ledger_net_aud=fmt_micros(ledger.net),
+                    ledger_gst_aud=fmt_micros(ledger.gst),
+
+                    in_manifest="N",
+                    manifest_row_count=0,
+                    pdf_present="N",
+                    pdf_count=0,
+                    pdf_paths="",
+                )
             )
 
+        # Deterministic output: GUID rows first (by GUID), then ledger-only
+        # rows (by invoice number), sorted once over the finished list.
+        master_rows.sort(
+            key=lambda r: (r.invoice_guid == "", r.invoice_guid, r.invoice_number)
+        )
+
         # 5) Write CSV to KV store
         filename_year = year if year else "unknown"
         kv_filename = f"ledger_master_{filename_year}.csv"
 
-        fieldnames = [
-            "Year",
-            "Invoice_GUID",
-            "Invoice_Number",
-            "Invoice_Type",
-            "Invoice_Date",
-            "Invoice_Contact",
-            "Invoice_Description",
-            "Invoice_Currency",
-            "Invoice_Line_Count",
-            "Invoice_Line_Total",
-            "Invoice_Tax_Total",
-            "In_Ledger",
-            "Ledger_Row_Count",
-            "Ledger_Gross_AUD",
-            "Ledger_Net_AUD",
-            "Ledger_GST_AUD",
-            "In_Manifest",
-            "Manifest_Row_Count",
-            "PDF_Present",
-            "PDF_Count",
-            "PDF_Paths",
-        ]
-
-        buf = io.StringIO()
-        writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction="ignore")
-        writer.writeheader()
-        for row in master_rows:
-            writer.writerow(row)
+        # Encode straight into a byte buffer so the KV store gets bytes and
+        # doesn't re-encode one big string.
+        buf = io.BytesIO()
+        text_io = io.TextIOWrapper(buf, encoding="utf-8", newline="")
+        writer = csv.writer(text_io)
+        writer.writerow(MASTER_CSV_HEADER)
+        writer.writerows(project_master_row(row) for row in master_rows)
+        text_io.flush()
 
         csv_data = buf.getvalue()
 
@@ -451,5 +670,4 @@ async def main() -> None:
 # -------- entrypoint --------
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())